@@ -0,0 +1,90 @@
+import asyncio
+import numpy as np
+
+
+class Batcher:
+    """
+    Micro-batcher for model inference.
+    Coalesces rows submitted by concurrent requests into a single
+    predict call, amortizing per-call sklearn/NumPy overhead. Under low
+    load each request is scored immediately, with no batching delay.
+    Predict calls run on `executor` (the loop's default executor if None)
+    so CPU-bound inference never blocks the event loop.
+    """
+
+    def __init__(self, predict_fn, max_batch=64, max_wait=0.005, executor=None):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = executor
+        self._queue = None
+        self._task = None
+        self._loop = None
+        self._inflight = set()
+
+    async def submit(self, rows):
+        """Queue a 2D array of rows and wait for their predictions"""
+        self._ensure_running()
+        future = self._loop.create_future()
+        await self._queue.put((rows, future))
+        return await future
+
+    def _ensure_running(self):
+        """Start the worker task on the current event loop if needed"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        """
+        Collect pending rows into one batch. A lone request is flushed at once;
+        only while an earlier batch is still being scored does the batcher wait
+        up to max_wait for more rows to share the next predict call.
+        """
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+
+            # Take everything that is already queued without waiting
+            while size < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                batch.append(item)
+                size += len(item[0])
+
+            if self._inflight:
+                deadline = self._loop.time() + self.max_wait
+                while size < self.max_batch:
+                    timeout = deadline - self._loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    batch.append(item)
+                    size += len(item[0])
+
+            # Keep collecting the next batch while this one is being scored
+            task = self._loop.create_task(self._flush(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _flush(self, batch):
+        """Run one predict call for the batch and resolve each caller's future"""
+        try:
+            features = np.vstack([rows for rows, _ in batch])
+            predictions = await self._loop.run_in_executor(self.executor, self.predict_fn, features)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        start = 0
+        for rows, future in batch:
+            end = start + len(rows)
+            if not future.done():
+                future.set_result(predictions[start:end])
+            start = end
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache for model predictions.
+    Unlike functools.lru_cache it supports explicit lookup and insert,
+    so callers can score only the rows that missed.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key and mark it as recently used"""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entry if full"""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Drop all cached entries (e.g. after the model is retrained)"""
+        self._data.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size, for the service's /health endpoint"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+    def __len__(self):
+        return len(self._data)
@@ -1,8 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import chain
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from pydantic import BaseModel
+from typing import List
+import math
+import msgspec
 import numpy as np
 import os
 
+from app.batcher import Batcher
+from app.cache import LRUCache
 from app.models.risk_model import RiskModel, generate_recommendations
 from app.models.churn_model import ChurnModel
 from app.models.anomaly_model import AnomalyModel
@@ -18,8 +26,63 @@ risk_model = RiskModel()
 churn_model = ChurnModel()
 anomaly_model = AnomalyModel()
 
-# Feature models
-class PRFeatures(BaseModel):
+# Micro-batchers coalescing concurrent requests into one model call.
+# BATCH_MAX_WAIT_MS bounds how long rows wait for company while a batch is in flight
+BATCH_MAX_WAIT = float(os.getenv("BATCH_MAX_WAIT_MS", 5)) / 1000
+risk_batcher = Batcher(risk_model.predict, max_wait=BATCH_MAX_WAIT)
+churn_batcher = Batcher(churn_model.predict, max_wait=BATCH_MAX_WAIT)
+anomaly_batcher = Batcher(anomaly_model.decision_scores, max_wait=BATCH_MAX_WAIT)
+batchers = (risk_batcher, churn_batcher, anomaly_batcher)
+
+# Rows per model scored by the startup warmup pass, drawn uniformly from
+# [0, upper) per feature, following the synthetic training data of each model
+WARMUP_ROWS = 256
+WARMUP_RANGES = (
+    (risk_batcher, (10, 20, 10, 10, 1, 1, 100, 1)),
+    (churn_batcher, (1000, 1000, 50, 200)),
+    (anomaly_batcher, (100, 250, 1)),
+)
+
+# Thread pool for CPU-bound inference; sklearn tree traversal releases the GIL
+executor = None
+
+# Prediction caches keyed by quantized feature tuples
+CACHE_SIZE = 4096
+CACHE_DECIMALS = 4
+risk_cache = LRUCache(maxsize=CACHE_SIZE)
+churn_cache = LRUCache(maxsize=CACHE_SIZE)
+anomaly_cache = LRUCache(maxsize=CACHE_SIZE)
+
+
+@dataclass(frozen=True)
+class RiskResult:
+    risk_score: float
+    top_factors: tuple
+
+
+def cache_key(values):
+    """Quantize feature values so near-identical requests share a cache entry"""
+    return tuple(round(float(v), CACHE_DECIMALS) for v in values)
+
+
+def set_cache_header(response, hit):
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+
+
+NON_FINITE_MESSAGE = "Feature values must be finite numbers"
+
+
+def require_finite(values):
+    """
+    Reject NaN and infinity, which lax decoding accepts from strings like "nan".
+    The forests would route them differently from sklearn, and NaN cache keys never match.
+    """
+    if not all(map(math.isfinite, values)):
+        raise ValueError(NON_FINITE_MESSAGE)
+
+
+# Feature models (request bodies are decoded by msgspec, see msgspec_body)
+class PRFeatures(msgspec.Struct):
     f1: float  # log(1 + lines_added + lines_deleted)
     f2: float  # files_changed
     f3: float  # commits_count
@@ -28,19 +91,101 @@ class PRFeatures(BaseModel):
     f6: float  # contributor_rejection_rate
     f7: float  # contributor_experience_score
     f8: float  # average_churn_of_modified_files
+    
+    def __post_init__(self):
+        require_finite(msgspec.structs.astuple(self))
 
 
-class FileFeatures(BaseModel):
+class FileFeatures(msgspec.Struct):
     additions: float = 0
     deletions: float = 0
     modifications: float = 0
     churn_history: float = 0
+    
+    def __post_init__(self):
+        require_finite(msgspec.structs.astuple(self))
+
 
+class ContributorFeatures(msgspec.Struct):
+    experience_score: float = 0
+    contributions: int = 0
+    rejection_rate: float = 0
 
-class ContributorFeatures(BaseModel):
-    experience_score: float
-    contributions: int
-    rejection_rate: float
+
+class AnomalyRequest(msgspec.Struct):
+    features: List[ContributorFeatures] = []
+
+
+class ContributorFeaturesSoA(msgspec.Struct):
+    """Contributor features as parallel lists, one entry per contributor"""
+    experience_scores: List[float] = []
+    contributions: List[int] = []
+    rejection_rates: List[float] = []
+    
+    def __post_init__(self):
+        if not len(self.experience_scores) == len(self.contributions) == len(self.rejection_rates):
+            raise ValueError("experience_scores, contributions and rejection_rates must have the same length")
+
+
+def msgspec_body(struct_type):
+    """
+    Dependency that decodes the raw JSON body straight into a msgspec Struct,
+    skipping FastAPI's json.loads + pydantic validation pass.
+    Lax mode accepts the same coercions as pydantic (e.g. 12.0 or "12" for an int).
+    Invalid bodies get a 422 whose detail is a single message string, e.g.
+    {"detail": "Expected `float`, got `str` - at `$.f1`"}.
+    """
+    decoder = msgspec.json.Decoder(struct_type, strict=False)
+    
+    async def decode(request: Request):
+        try:
+            return decoder.decode(await request.body())
+        except msgspec.DecodeError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
+    return decode
+
+
+# Struct schemas referenced by msgspec_openapi, merged into the OpenAPI components
+BODY_SCHEMAS = {}
+
+
+def msgspec_openapi(struct_type):
+    """
+    openapi_extra documenting a msgspec_body request body and its 422 error,
+    since FastAPI cannot derive either from the dependency
+    """
+    (body_schema,), components = msgspec.json.schema_components(
+        [struct_type], ref_template="#/components/schemas/{name}"
+    )
+    BODY_SCHEMAS.update(components)
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": body_schema}}
+        },
+        "responses": {
+            "422": {
+                "description": "Invalid request body",
+                "content": {"application/json": {"schema": {
+                    "type": "object",
+                    "properties": {"detail": {"type": "string"}},
+                    "required": ["detail"]
+                }}}
+            }
+        }
+    }
+
+
+def openapi():
+    """FastAPI's generated schema plus the msgspec body schemas"""
+    if app.openapi_schema is None:
+        schema = FastAPI.openapi(app)
+        schema.setdefault("components", {}).setdefault("schemas", {}).update(BODY_SCHEMAS)
+    return app.openapi_schema
+
+
+app.openapi = openapi
 
 
 class RiskPredictionResponse(BaseModel):
@@ -64,6 +209,45 @@ class AnomalyResponse(BaseModel):
     model_used: str
 
 
+@app.on_event("startup")
+async def load_models():
+    # Load (or train) every model before serving so no request pays for it
+    risk_model.load_or_train()
+    churn_model.load_or_train()
+    anomaly_model.load_or_train()
+
+
+@app.on_event("startup")
+async def start_executor():
+    global executor
+    # Split the cores between uvicorn worker processes to avoid oversubscription
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="predict")
+    for batcher in batchers:
+        batcher.executor = executor
+
+
+@app.on_event("startup")
+async def warm_up():
+    # The first predict calls pay for lazy initialization, executor thread start-up
+    # and page faults in the mapped model files; take that hit before serving
+    rng = np.random.default_rng(0)
+    for batcher, upper in WARMUP_RANGES:
+        await batcher.submit(np.zeros((1, len(upper)), dtype=np.float32))
+        # Rows spread over the training ranges reach over half of every forest's leaves
+        rows = rng.random((WARMUP_ROWS, len(upper))) * upper
+        await batcher.submit(rows.astype(np.float32))
+
+
+@app.on_event("shutdown")
+async def stop_executor():
+    for batcher in batchers:
+        batcher.executor = None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
 @app.get("/")
 async def root():
     return {
@@ -75,7 +259,15 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    # Cache counters are per worker process
+    return {
+        "status": "healthy",
+        "caches": {
+            "risk": risk_cache.stats(),
+            "churn": churn_cache.stats(),
+            "anomaly": anomaly_cache.stats()
+        }
+    }
 
 
 @app.post("/ml/train-risk-model", response_model=dict)
@@ -86,6 +278,7 @@ async def train_risk_model(request: dict):
         # In production, fetch real training data from database
         # For now, use pre-trained model
         risk_model.load_or_train()
+        risk_cache.clear()
         return {
             "success": True,
             "message": "Risk model trained/loaded",
@@ -95,24 +288,36 @@ async def train_risk_model(request: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/ml/predict-risk", response_model=RiskPredictionResponse)
-async def predict_risk(features: PRFeatures):
+@app.post("/ml/predict-risk", response_model=RiskPredictionResponse, openapi_extra=msgspec_openapi(PRFeatures))
+async def predict_risk(response: Response, features: PRFeatures = Depends(msgspec_body(PRFeatures))):
     """Predict risk score for a pull request with explainable factors"""
     try:
-        feature_array = np.array([[
+        key = cache_key((
             features.f1, features.f2, features.f3, features.f4,
             features.f5, features.f6, features.f7, features.f8
-        ]])
+        ))
+        
+        result = risk_cache.get(key)
+        set_cache_header(response, result is not None)
         
-        # Get risk score prediction
-        risk_score = float(risk_model.predict(feature_array)[0])
+        if result is None:
+            # Trees compare in float32; build that layout up front to avoid a conversion copy
+            feature_array = np.ascontiguousarray([key], dtype=np.float32)
+            
+            # Get risk score prediction
+            risk_score = float((await risk_batcher.submit(feature_array))[0])
+            
+            # Get top 3 contributing factors
+            top_factors = risk_model.get_feature_importance(feature_array)
+            
+            result = risk_cache.put(key, RiskResult(risk_score, tuple(top_factors)))
+        
+        risk_score = result.risk_score
+        top_factors = list(result.top_factors)
         
         # Get risk level
         risk_level = risk_model.get_risk_level(risk_score)
         
-        # Get top 3 contributing factors
-        top_factors = risk_model.get_feature_importance(feature_array)
-        
         # Format top factors for response
         formatted_factors = []
         for factor in top_factors:
@@ -137,18 +342,23 @@ async def predict_risk(features: PRFeatures):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/ml/predict-churn", response_model=ChurnPredictionResponse)
-async def predict_churn(features: FileFeatures):
+@app.post("/ml/predict-churn", response_model=ChurnPredictionResponse, openapi_extra=msgspec_openapi(FileFeatures))
+async def predict_churn(response: Response, features: FileFeatures = Depends(msgspec_body(FileFeatures))):
     """Predict file churn probability"""
     try:
-        feature_array = np.array([[
+        key = cache_key((
             features.additions,
             features.deletions,
             features.modifications,
             features.churn_history
-        ]])
+        ))
         
-        churn_prob = churn_model.predict(feature_array)[0]
+        churn_prob = churn_cache.get(key)
+        set_cache_header(response, churn_prob is not None)
+        
+        if churn_prob is None:
+            churn_prob = float((await churn_batcher.submit(np.ascontiguousarray([key], dtype=np.float32)))[0])
+            churn_cache.put(key, churn_prob)
         
         # Determine churn level
         if churn_prob > 0.8:
@@ -169,42 +379,96 @@ async def predict_churn(features: FileFeatures):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/ml/detect-anomalies", response_model=AnomalyResponse)
-async def detect_anomalies(request: dict):
+async def score_contributors(feature_array, response):
+    """Score an (n, 3) contributor feature matrix, reusing cached rows"""
+    # Checked on the assembled matrix: one vectorized pass instead of a hook per contributor
+    if not np.isfinite(feature_array).all():
+        raise HTTPException(status_code=422, detail=NON_FINITE_MESSAGE)
+    
+    if len(feature_array) == 0:
+        # Return empty result if no features provided
+        return AnomalyResponse(
+            anomaly_scores=[],
+            flagged_contributors=[],
+            model_used="IsolationForest"
+        )
+    
+    quantized = feature_array.round(CACHE_DECIMALS)
+    keys = list(map(tuple, quantized.tolist()))
+    
+    # Raw decision scores are per-row, so only uncached contributors hit the model
+    raw_scores = np.empty(len(keys))
+    missing = []
+    for i, key in enumerate(keys):
+        cached = anomaly_cache.get(key)
+        if cached is None:
+            missing.append(i)
+        else:
+            raw_scores[i] = cached
+    set_cache_header(response, not missing)
+    
+    if missing:
+        computed = await anomaly_batcher.submit(
+            np.ascontiguousarray(quantized[missing], dtype=np.float32)
+        )
+        raw_scores[missing] = computed
+        for i, score in zip(missing, computed):
+            anomaly_cache.put(keys[i], float(score))
+    
+    anomaly_scores = anomaly_model.normalize_scores(raw_scores)
+    
+    # Flag contributors with high anomaly scores
+    flagged = [
+        {
+            "index": int(i),
+            "anomaly_score": float(anomaly_scores[i]),
+            "flag": "Unusual activity pattern"
+        }
+        for i in np.flatnonzero(anomaly_scores > 0.5)
+    ]
+    
+    return AnomalyResponse(
+        anomaly_scores=anomaly_scores.tolist(),
+        flagged_contributors=flagged,
+        model_used="IsolationForest"
+    )
+
+
+@app.post("/ml/detect-anomalies", response_model=AnomalyResponse, openapi_extra=msgspec_openapi(AnomalyRequest))
+async def detect_anomalies(response: Response, request: AnomalyRequest = Depends(msgspec_body(AnomalyRequest))):
     """Detect contributor anomalies using Isolation Forest"""
     try:
-        features = request.get("features", [])
-        
-        if not features:
-            # Return empty result if no features provided
-            return AnomalyResponse(
-                anomaly_scores=[],
-                flagged_contributors=[],
-                model_used="IsolationForest"
-            )
-        
-        feature_array = np.array([
-            [f.get("experience_score", 0), f.get("contributions", 0), f.get("rejection_rate", 0)]
+        features = request.features
+        n = len(features)
+        values = chain.from_iterable(
+            (f.experience_score, f.contributions, f.rejection_rate)
             for f in features
-        ])
-        
-        anomaly_scores = anomaly_model.predict(feature_array)
+        )
+        feature_array = np.fromiter(values, dtype=np.float64, count=3 * n).reshape(n, 3)
         
-        # Flag contributors with high anomaly scores
-        flagged = []
-        for i, score in enumerate(anomaly_scores):
-            if score > 0.5:
-                flagged.append({
-                    "index": i,
-                    "anomaly_score": float(score),
-                    "flag": "Unusual activity pattern"
-                })
+        return await score_contributors(feature_array, response)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/ml/detect-anomalies/columns", response_model=AnomalyResponse, openapi_extra=msgspec_openapi(ContributorFeaturesSoA))
+async def detect_anomalies_columns(
+    response: Response,
+    request: ContributorFeaturesSoA = Depends(msgspec_body(ContributorFeaturesSoA))
+):
+    """Detect contributor anomalies from column-oriented (one list per feature) input"""
+    try:
+        # Fill each column straight from its list, without per-contributor objects
+        feature_array = np.empty((len(request.experience_scores), 3))
+        feature_array[:, 0] = request.experience_scores
+        feature_array[:, 1] = request.contributions
+        feature_array[:, 2] = request.rejection_rates
         
-        return AnomalyResponse(
-            anomaly_scores=[float(s) for s in anomaly_scores],
-            flagged_contributors=flagged,
-            model_used="IsolationForest"
-        )
+        return await score_contributors(feature_array, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -212,4 +476,20 @@ async def detect_anomalies(request: dict):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    limit_concurrency = os.getenv("LIMIT_CONCURRENCY")
+    
+    # One process per core by default; each worker loads its own models, while
+    # the compiled libraries and memory-mapped arrays are shared via the page cache
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        loop="auto",  # uvloop when installed
+        http="auto",  # httptools when installed
+        limit_concurrency=int(limit_concurrency) if limit_concurrency else None,
+        backlog=int(os.getenv("BACKLOG", 2048))
+    )
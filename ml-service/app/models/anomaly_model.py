@@ -3,6 +3,9 @@ from sklearn.ensemble import IsolationForest
 import joblib
 import os
 
+from app.models.compiled import compile_forest
+from app.models.forest import average_path_length, flatten_isolation_forest
+
 class AnomalyModel:
     """
     Contributor Anomaly Detection Model
@@ -12,6 +15,11 @@ class AnomalyModel:
     def __init__(self):
         self.model = None
         self.is_trained = False
+        self._forest = None
+        self._compiled = None
+        self._max_path_length = None
+        self._score_min = None
+        self._score_max = None
         
     def load_or_train(self):
         """Load pre-trained model or train a new one"""
@@ -19,18 +27,22 @@ class AnomalyModel:
         
         if os.path.exists(model_path):
             try:
-                self.model = joblib.load(model_path)
+                # Memory-map the arrays so worker processes can share pages via the OS cache
+                self.model = joblib.load(model_path, mmap_mode='r')
+            except Exception as e:
+                print(f"Could not load model: {e}")
+            else:
+                # Errors past this point are real failures; never retrain over a model that loaded
                 self.is_trained = True
+                self._build_forest(model_path)
                 print("✅ Loaded pre-trained anomaly model")
                 return
-            except Exception as e:
-                print(f"Could not load model: {e}")
         
         # Train with synthetic data for demo
         self._train_synthetic()
         
-    def _train_synthetic(self):
-        """Train model with synthetic data for demonstration"""
+    def _synthetic_data(self):
+        """Synthetic contributor features used for the demo model"""
         np.random.seed(42)
         n_samples = 200
         
@@ -49,7 +61,11 @@ class AnomalyModel:
             size=int(n_samples * 0.1)
         )
         
-        X = np.vstack([X_normal, X_anomaly])
+        return np.vstack([X_normal, X_anomaly])
+    
+    def _train_synthetic(self):
+        """Train model with synthetic data for demonstration"""
+        X = self._synthetic_data()
         
         # Train Isolation Forest
         self.model = IsolationForest(
@@ -60,30 +76,64 @@ class AnomalyModel:
         self.model.fit(X)
         self.is_trained = True
         
+        # Calibrate once on the training data; stored on the estimator so it is saved with it
+        raw_scores = self.model.decision_function(X)
+        self.model.score_range_ = (float(raw_scores.min()), float(raw_scores.max()))
+        
         # Save model
         os.makedirs(os.path.join(os.path.dirname(__file__), '../../models'), exist_ok=True)
         model_path = os.path.join(os.path.dirname(__file__), '../../models/anomaly_model.joblib')
         joblib.dump(self.model, model_path)
+        self._build_forest(model_path)
         
         print("✅ Trained new anomaly model with synthetic data")
     
+    def _build_forest(self, model_path):
+        """Prepare the inference path: compiled if available, NumPy otherwise"""
+        self._forest = flatten_isolation_forest(self.model)
+        self._compiled = compile_forest(self.model, model_path)
+        self._max_path_length = float(average_path_length([self.model.max_samples_])[0])
+        
+        # Models saved before calibration was added were trained on the synthetic data
+        if not hasattr(self.model, 'score_range_'):
+            raw_scores = self.model.decision_function(self._synthetic_data())
+            self.model.score_range_ = (float(raw_scores.min()), float(raw_scores.max()))
+        self._score_min, self._score_max = self.model.score_range_
+    
     def predict(self, features):
         """
         Predict anomaly scores for contributor features
         Returns scores between 0-1 where higher = more anomalous
         """
+        return self.normalize_scores(self.decision_scores(features))
+    
+    def decision_scores(self, features):
+        """
+        Raw Isolation Forest decision scores (-1 to 1, lower = more anomalous).
+        Each row is scored independently, so results can be cached per contributor.
+        """
         if not self.is_trained:
-            self.load_or_train()
+            raise RuntimeError("Anomaly model is not loaded; call load_or_train() at startup")
         
         if features.shape[1] != 3:
             raise ValueError(f"Expected 3 features, got {features.shape[1]}")
         
-        # Get anomaly scores (-1 to 1 from Isolation Forest)
-        # Convert to 0-1 scale where 1 = most anomalous
-        raw_scores = self.model.decision_function(features)
-        
+        # Same as IsolationForest.decision_function
+        if self._compiled is not None:
+            scores = self._compiled.predict(features)
+        else:
+            scores = 2 ** (-self._forest.predict(features) / self._max_path_length)
+        return -scores - self.model.offset_
+    
+    def normalize_scores(self, raw_scores):
+        """
+        Convert raw decision scores to 0-1 anomaly scores where 1 = most anomalous.
+        Uses the score range seen in training, so each score is independent of the batch.
+        """
         # Normalize to 0-1
-        normalized_scores = (raw_scores - raw_scores.min()) / (raw_scores.max() - raw_scores.min() + 1e-10)
+        normalized_scores = np.clip(
+            (raw_scores - self._score_min) / (self._score_max - self._score_min + 1e-10), 0, 1
+        )
         
         # Invert: higher score = more anomalous
         anomaly_scores = 1 - normalized_scores
@@ -93,7 +143,7 @@ class AnomalyModel:
     def predict_batch(self, features):
         """Predict anomaly scores for multiple contributors"""
         if not self.is_trained:
-            self.load_or_train()
+            raise RuntimeError("Anomaly model is not loaded; call load_or_train() at startup")
         
         return self.predict(features)
     
@@ -3,6 +3,9 @@ from sklearn.ensemble import RandomForestRegressor
 import joblib
 import os
 
+from app.models.compiled import compile_forest
+from app.models.forest import flatten_regressor, prune_forest
+
 class ChurnModel:
     """
     File Churn Prediction Model
@@ -12,6 +15,8 @@ class ChurnModel:
     def __init__(self):
         self.model = None
         self.is_trained = False
+        self._forest = None
+        self._compiled = None
         
     def load_or_train(self):
         """Load pre-trained model or train a new one"""
@@ -19,12 +24,16 @@ class ChurnModel:
         
         if os.path.exists(model_path):
             try:
-                self.model = joblib.load(model_path)
+                # Memory-map the arrays so worker processes can share pages via the OS cache
+                self.model = joblib.load(model_path, mmap_mode='r')
+            except Exception as e:
+                print(f"Could not load model: {e}")
+            else:
+                # Errors past this point are real failures; never retrain over a model that loaded
                 self.is_trained = True
+                self._build_forest(model_path)
                 print("✅ Loaded pre-trained churn model")
                 return
-            except Exception as e:
-                print(f"Could not load model: {e}")
         
         # Train with synthetic data for demo
         self._train_synthetic()
@@ -63,22 +72,29 @@ class ChurnModel:
         os.makedirs(os.path.join(os.path.dirname(__file__), '../../models'), exist_ok=True)
         model_path = os.path.join(os.path.dirname(__file__), '../../models/churn_model.joblib')
         joblib.dump(self.model, model_path)
+        self._build_forest(model_path)
         
         print("✅ Trained new churn model with synthetic data")
     
+    def _build_forest(self, model_path):
+        """Prepare the inference path: compiled if available, NumPy otherwise"""
+        forest = prune_forest(self.model)
+        self._forest = flatten_regressor(forest)
+        self._compiled = compile_forest(forest, model_path)
+    
     def predict(self, features):
         """Predict churn probability for file features"""
         if not self.is_trained:
-            self.load_or_train()
+            raise RuntimeError("Churn model is not loaded; call load_or_train() at startup")
         
         if features.shape[1] != 4:
             raise ValueError(f"Expected 4 features, got {features.shape[1]}")
         
-        return np.clip(self.model.predict(features), 0, 1)
+        return np.clip((self._compiled or self._forest).predict(features), 0, 1)
     
     def predict_batch(self, features):
         """Predict churn scores for multiple files"""
         if not self.is_trained:
-            self.load_or_train()
+            raise RuntimeError("Churn model is not loaded; call load_or_train() at startup")
         
-        return np.clip(self.model.predict(features), 0, 1)
+        return np.clip((self._compiled or self._forest).predict(features), 0, 1)
@@ -0,0 +1,91 @@
+import glob
+import hashlib
+import os
+import numpy as np
+
+# Compiled inference is optional: without treelite/tl2cgen (or a C compiler)
+# the models fall back to the NumPy FlatForest path
+try:
+    import tl2cgen
+    import treelite
+except ImportError:
+    tl2cgen = None
+    treelite = None
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; builds are then unserialized
+    fcntl = None
+
+
+class CompiledForest:
+    """
+    Tree ensemble compiled to a native shared library with Treelite/TL2cgen.
+    predict() mirrors FlatForest: class probabilities for classifiers,
+    the regression output for regressors and the anomaly score
+    (2 ** -mean_path_length / c) for isolation forests.
+    """
+
+    def __init__(self, libpath):
+        # One thread per call; concurrency comes from the service's executor
+        self._predictor = tl2cgen.Predictor(libpath, nthread=1)
+
+    def predict(self, features):
+        X = np.asarray(features, dtype=np.float32)
+        output = self._predictor.predict(tl2cgen.DMatrix(X))
+        return output[:, 0, 0] if output.shape[2] == 1 else output[:, 0, :]
+
+
+def forest_fingerprint(model):
+    """
+    Digest of the trees a fitted forest actually contains, so a library
+    built from a differently pruned (or retrained) forest is never reused
+    """
+    digest = hashlib.sha1(type(model).__name__.encode())
+    for i, estimator in enumerate(model.estimators_):
+        tree = estimator.tree_
+        for array in (tree.children_left, tree.children_right, tree.feature,
+                      tree.threshold, tree.value, tree.n_node_samples):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        if hasattr(model, 'estimators_features_'):
+            digest.update(np.asarray(model.estimators_features_[i]).tobytes())
+    return digest.hexdigest()[:12]
+
+
+def compile_forest(model, model_path):
+    """
+    Compile a fitted sklearn forest next to its .joblib file and load it.
+    The library name records the tree count and a fingerprint of the trees,
+    so it is rebuilt whenever the model or its pruning changes. Concurrent
+    workers serialize on a lock and only the first one compiles.
+    Returns None when compilation is unavailable or fails.
+    """
+    if tl2cgen is None:
+        return None
+
+    stem = os.path.splitext(model_path)[0]
+    libpath = f"{stem}-{len(model.estimators_)}trees-{forest_fingerprint(model)}.so"
+    try:
+        # Lock the model file itself, so the other workers wait for the first one's build
+        with open(model_path, 'rb') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(libpath):
+                # Build under a private name so no worker ever loads a partial library
+                tmp_path = f"{stem}.{os.getpid()}.tmp.so"
+                tl2cgen.export_lib(
+                    treelite.sklearn.import_model(model),
+                    toolchain='gcc',
+                    libpath=tmp_path,
+                    params={'parallel_comp': os.cpu_count() or 1}
+                )
+                os.replace(tmp_path, libpath)
+                print(f"✅ Compiled {os.path.basename(libpath)}")
+                # Libraries built for other versions of this model are stale now
+                for stale in glob.glob(f"{glob.escape(stem)}-*trees-*.so"):
+                    if stale != libpath:
+                        os.remove(stale)
+        return CompiledForest(libpath)
+    except Exception as e:
+        print(f"Could not compile model: {e}")
+        return None
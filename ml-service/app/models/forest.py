@@ -0,0 +1,230 @@
+import copy
+
+import numpy as np
+
+TREE_LEAF = -1
+
+# Number of levels stored in the implicit (heap-ordered) layout of each tree
+TOP_LEVELS = 6
+
+# Share of the total impurity decrease the kept trees must account for
+PRUNE_COVERAGE = 0.99
+
+
+class FlatForest:
+    """
+    Tree ensemble flattened into contiguous NumPy arrays.
+    All trees are walked together, one level per step, so inference is
+    a handful of vectorized gathers instead of per-tree sklearn calls.
+
+    The first TOP_LEVELS levels of every tree are laid out as a complete
+    binary tree, so those steps compute the next slot as 2*i + 1 + go_right
+    instead of loading child pointers. Deeper nodes use the pointer arrays.
+
+    Arrays use the narrowest dtypes that keep results exact: float32
+    thresholds (rounded down, see float32_floor), int8/int16 indices where
+    they fit and float32 node values.
+    """
+
+    def __init__(self, trees, node_values, feature_maps=None):
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        self.depth = max(tree.max_depth for tree in trees)
+        self.top_levels = min(TOP_LEVELS, self.depth)
+        feature, threshold, left, right = [], [], [], []
+        top_feature, top_threshold, exits = [], [], []
+
+        for i, tree in enumerate(trees):
+            is_leaf = tree.children_left == TREE_LEAF
+            nodes = np.arange(tree.node_count) + offsets[i]
+            tree_features = np.where(is_leaf, 0, tree.feature)
+            if feature_maps is not None:
+                tree_features = np.asarray(feature_maps[i])[tree_features]
+
+            feature.append(tree_features)
+            threshold.append(tree.threshold)
+            # Leaves point back at themselves so every tree can take the same number of steps
+            left.append(np.where(is_leaf, nodes, tree.children_left + offsets[i]))
+            right.append(np.where(is_leaf, nodes, tree.children_right + offsets[i]))
+
+            level_features, level_thresholds, exit_nodes = self._top_levels(tree, tree_features)
+            top_feature.append(level_features)
+            top_threshold.append(level_thresholds)
+            exits.append(exit_nodes + offsets[i])
+
+        feature = np.concatenate(feature)
+        node_dtype = index_dtype(offsets[-1])
+        feature_dtype = index_dtype(feature.max() + 1)
+
+        self.feature = feature.astype(feature_dtype)
+        self.threshold = float32_floor(np.concatenate(threshold))
+        self.left = np.concatenate(left).astype(node_dtype)
+        self.right = np.concatenate(right).astype(node_dtype)
+        self.value = np.concatenate(node_values).astype(np.float32)
+
+        n_trees = len(trees)
+        self.top_feature = np.concatenate(top_feature).astype(feature_dtype)
+        self.top_threshold = float32_floor(np.concatenate(top_threshold))
+        self.exits = np.concatenate(exits).astype(node_dtype)
+        self._top_base = (np.arange(n_trees) * (2 ** self.top_levels - 1)).astype(np.int32)
+        self._exit_base = (np.arange(n_trees) * 2 ** self.top_levels - (2 ** self.top_levels - 1)).astype(np.int32)
+
+    def _top_levels(self, tree, tree_features):
+        """
+        Heap-ordered split arrays for the top levels of one tree and the
+        node each bottom slot continues from. Below a shallow leaf every
+        slot is a dummy (nan threshold) that exits to that same leaf.
+        """
+        level_nodes = np.array([0])
+        # Forests of single-leaf trees have no top levels; every tree exits at its root
+        level_features, level_thresholds = [np.zeros(0, dtype=np.intp)], [np.zeros(0)]
+
+        for _ in range(self.top_levels):
+            is_leaf = tree.children_left[level_nodes] == TREE_LEAF
+            level_features.append(np.where(is_leaf, 0, tree_features[level_nodes]))
+            level_thresholds.append(np.where(is_leaf, np.nan, tree.threshold[level_nodes]))
+            children_left = np.where(is_leaf, level_nodes, tree.children_left[level_nodes])
+            children_right = np.where(is_leaf, level_nodes, tree.children_right[level_nodes])
+            # Slot i at this level has its children at slots 2i and 2i + 1 of the next one
+            level_nodes = np.column_stack([children_left, children_right]).ravel()
+
+        return np.concatenate(level_features), np.concatenate(level_thresholds), level_nodes
+
+    def apply(self, features):
+        """
+        Return the leaf reached by each row in each tree, shape (n_samples, n_trees).
+        Inputs must be finite: NaN does not follow sklearn's missing-value routing.
+        """
+        # sklearn compares float32 inputs, which float32_floor thresholds preserve exactly
+        X = np.asarray(features, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+
+        slots = np.zeros((X.shape[0], len(self._top_base)), dtype=np.int32)
+        for _ in range(self.top_levels):
+            index = self._top_base + slots
+            go_right = X[rows, self.top_feature[index]] > self.top_threshold[index]
+            slots = 2 * slots + 1 + go_right
+
+        nodes = self.exits[self._exit_base + slots]
+        for _ in range(self.depth - self.top_levels):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return nodes
+
+    def predict(self, features):
+        """Average the leaf values reached in every tree"""
+        return self.value[self.apply(features)].mean(axis=1, dtype=np.float64)
+
+
+def float32_floor(thresholds):
+    """
+    Largest float32 not above each float64 threshold.
+    For float32 inputs x, x <= t holds exactly when x <= float32_floor(t),
+    so the narrower thresholds never change a split decision.
+    """
+    rounded = thresholds.astype(np.float32)
+    return np.where(rounded > thresholds, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+
+def index_dtype(size):
+    """Narrowest signed integer dtype that can index `size` elements"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if size <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def flatten_classifier(model):
+    """Flatten a fitted RandomForestClassifier; predict() returns class probabilities"""
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    values = []
+    for tree in trees:
+        counts = tree.value[:, 0, :]
+        totals = counts.sum(axis=1, keepdims=True)
+        values.append(counts / np.where(totals == 0, 1.0, totals))
+    return FlatForest(trees, values)
+
+
+def flatten_regressor(model):
+    """Flatten a fitted RandomForestRegressor; predict() returns the regression output"""
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    return FlatForest(trees, [tree.value[:, 0, 0] for tree in trees])
+
+
+def flatten_isolation_forest(model):
+    """
+    Flatten a fitted IsolationForest; predict() returns the mean path length,
+    including the average path length correction for unsplit leaves.
+    """
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    # sklearn counts nodes on the decision path (root = 1) and subtracts one,
+    # which equals the edge depth used here
+    values = [
+        node_depths(tree) + average_path_length(tree.n_node_samples)
+        for tree in trees
+    ]
+
+    n_features = model.n_features_in_
+    subsample_features = model.bootstrap_features or any(
+        len(features) != n_features for features in model.estimators_features_
+    )
+    feature_maps = model.estimators_features_ if subsample_features else None
+
+    return FlatForest(trees, values, feature_maps)
+
+
+def impurity_decrease(tree):
+    """Total weighted impurity decrease over all splits of a fitted tree"""
+    internal = tree.children_left != TREE_LEAF
+    left = tree.children_left[internal]
+    right = tree.children_right[internal]
+    weighted = tree.weighted_n_node_samples * tree.impurity
+    return float((weighted[internal] - weighted[left] - weighted[right]).sum())
+
+
+def prune_forest(model, coverage=PRUNE_COVERAGE):
+    """
+    Shallow copy of a fitted random forest keeping the fewest trees, by
+    descending impurity decrease, that together account for `coverage` of
+    the forest's total. Original tree order is kept; `model` is unchanged.
+    """
+    if coverage >= 1.0:
+        return model
+
+    contributions = np.array([impurity_decrease(estimator.tree_) for estimator in model.estimators_])
+    total = contributions.sum()
+    if total <= 0:
+        return model
+
+    order = np.argsort(-contributions, kind='stable')
+    cumulative = np.cumsum(contributions[order]) / total
+    n_keep = int(np.searchsorted(cumulative, coverage)) + 1
+
+    pruned = copy.copy(model)
+    pruned.estimators_ = [model.estimators_[i] for i in np.sort(order[:n_keep])]
+    pruned.n_estimators = n_keep
+    return pruned
+
+
+def node_depths(tree):
+    """Edge depth of every node in a fitted sklearn tree (root = 0)"""
+    depths = np.zeros(tree.node_count)
+    # sklearn stores children after their parent, so one forward pass suffices
+    for node in range(tree.node_count):
+        if tree.children_left[node] != TREE_LEAF:
+            depths[tree.children_left[node]] = depths[node] + 1
+            depths[tree.children_right[node]] = depths[node] + 1
+    return depths
+
+
+def average_path_length(n_samples):
+    """Average path length of an unsuccessful BST search over n_samples nodes"""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    lengths = np.zeros_like(n_samples)
+    lengths[n_samples == 2] = 1.0
+    large = n_samples > 2
+    lengths[large] = (
+        2.0 * (np.log(n_samples[large] - 1.0) + np.euler_gamma)
+        - 2.0 * (n_samples[large] - 1.0) / n_samples[large]
+    )
+    return lengths
@@ -2,8 +2,12 @@ import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 import joblib
+import math
 import os
 
+from app.models.compiled import compile_forest
+from app.models.forest import flatten_classifier, prune_forest
+
 # Feature names for explanation
 FEATURE_NAMES = [
     "PR Size (Lines)",
@@ -28,6 +32,12 @@ FEATURE_DESCRIPTIONS = {
     "File Churn Score": "High File Churn"
 }
 
+# PRs above this many changed lines get a "split this PR" recommendation.
+# f1 is log(1 + lines), and int(exp(f1) - 1) > 1500 exactly when exp(f1) >= 1502,
+# so the rule compares f1 against log(1502) without calling exp
+LARGE_PR_LINES = 1500
+_LOG_LARGE_PR = math.log(LARGE_PR_LINES + 2)
+
 class RiskModel:
     """
     PR Risk Prediction Model
@@ -40,6 +50,9 @@ class RiskModel:
         self.scaler = StandardScaler()
         self.is_trained = False
         self.feature_importances_ = None
+        self._forest = None
+        self._compiled = None
+        self._feature_descriptions = [FEATURE_DESCRIPTIONS[name] for name in FEATURE_NAMES]
         
     def load_or_train(self):
         """Load pre-trained model or train a new one"""
@@ -47,14 +60,18 @@ class RiskModel:
         
         if os.path.exists(model_path):
             try:
-                self.model = joblib.load(model_path)
+                # Memory-map the arrays so worker processes can share pages via the OS cache
+                self.model = joblib.load(model_path, mmap_mode='r')
+            except Exception as e:
+                print(f"Could not load model: {e}")
+            else:
+                # Errors past this point are real failures; never retrain over a model that loaded
                 self.is_trained = True
                 # Extract feature importances
                 self.feature_importances_ = self.model.feature_importances_
+                self._build_forest(model_path)
                 print("✅ Loaded pre-trained risk model")
                 return
-            except Exception as e:
-                print(f"Could not load model: {e}")
         
         # Train with synthetic data for demo
         self._train_synthetic()
@@ -102,19 +119,30 @@ class RiskModel:
         os.makedirs(os.path.join(os.path.dirname(__file__), '../../models'), exist_ok=True)
         model_path = os.path.join(os.path.dirname(__file__), '../../models/risk_model.joblib')
         joblib.dump(self.model, model_path)
+        self._build_forest(model_path)
         
         print("✅ Trained new risk model with synthetic data")
     
+    def _build_forest(self, model_path):
+        """Prepare the inference path: compiled if available, NumPy otherwise"""
+        forest = prune_forest(self.model)
+        self._forest = flatten_classifier(forest)
+        self._compiled = compile_forest(forest, model_path)
+    
+    def _predict_proba(self, features):
+        """Class probabilities from the fastest available inference path"""
+        return (self._compiled or self._forest).predict(features)
+    
     def predict(self, features):
         """Predict risk score for PR features"""
         if not self.is_trained:
-            self.load_or_train()
+            raise RuntimeError("Risk model is not loaded; call load_or_train() at startup")
         
         if features.shape[1] != 8:
             raise ValueError(f"Expected 8 features, got {features.shape[1]}")
         
         # Get probability of high risk (class 1)
-        probabilities = self.model.predict_proba(features)
+        probabilities = self._predict_proba(features)
         
         if probabilities.shape[1] == 2:
             return probabilities[:, 1]
@@ -124,9 +152,9 @@ class RiskModel:
     def predict_batch(self, features):
         """Predict risk scores for multiple PRs"""
         if not self.is_trained:
-            self.load_or_train()
+            raise RuntimeError("Risk model is not loaded; call load_or_train() at startup")
         
-        return self.model.predict_proba(features)[:, 1]
+        return self._predict_proba(features)[:, 1]
     
     def get_feature_importance(self, features):
         """
@@ -135,37 +163,38 @@ class RiskModel:
         to determine which factors most influenced this prediction.
         """
         if not self.is_trained:
-            self.load_or_train()
+            raise RuntimeError("Risk model is not loaded; call load_or_train() at startup")
         
         # Get feature values
         feature_values = features[0] if features.ndim > 1 else features
         
         # Calculate impact based on feature importance and feature values
         # Higher values in high-importance features = higher impact
-        impacts = []
-        for i, (importance, value) in enumerate(zip(self.feature_importances_, feature_values)):
-            # Normalize value to 0-1 range based on typical ranges
-            normalized_value = min(value / 10, 1.0)  # Normalize to reasonable range
-            impact = importance * normalized_value
-            impacts.append({
-                'feature': FEATURE_NAMES[i],
-                'description': FEATURE_DESCRIPTIONS[FEATURE_NAMES[i]],
-                'value': float(value),
-                'importance': float(importance),
-                'impact_weight': float(impact)
-            })
+        # Values are normalized to a 0-1 range based on typical ranges
+        impacts = self.feature_importances_ * np.minimum(feature_values / 10, 1.0)
         
-        # Sort by impact weight descending
-        impacts.sort(key=lambda x: x['impact_weight'], reverse=True)
+        # Top 3 by impact weight descending (ties keep feature order).
+        # A full stable sort of 8 values is cheaper than argpartition plus tie handling
+        top = np.argsort(-impacts, kind='stable')[:3].tolist()
         
         # Normalize impact weights to sum to 1
-        total_impact = sum(item['impact_weight'] for item in impacts)
-        if total_impact > 0:
-            for item in impacts:
-                item['impact_weight'] = round(item['impact_weight'] / total_impact, 2)
+        total_impact = float(impacts.sum())
         
-        # Return top 3 factors
-        return impacts[:3]
+        # Convert each array once instead of boxing a NumPy scalar per field
+        impacts = impacts.tolist()
+        values = feature_values.tolist()
+        importances = self.feature_importances_.tolist()
+        
+        return [
+            {
+                'feature': FEATURE_NAMES[i],
+                'description': self._feature_descriptions[i],
+                'value': values[i],
+                'importance': importances[i],
+                'impact_weight': round(impacts[i] / total_impact, 2) if total_impact > 0 else impacts[i]
+            }
+            for i in top
+        ]
     
     def get_risk_level(self, risk_score):
         """Determine risk level from score"""
@@ -193,11 +222,8 @@ def generate_recommendations(features, risk_score, top_factors):
     experience_score = features.f7
     churn_score = features.f8
     
-    # Convert log scale back to approximate lines
-    approx_lines = int(np.exp(lines_added_deleted) - 1)
-    
     # Recommendation rules
-    if approx_lines > 1500:
+    if lines_added_deleted > _LOG_LARGE_PR:  # more than LARGE_PR_LINES lines
         recommendations.append("Consider splitting this PR into smaller modules to reduce review complexity.")
     
     if files_changed > 10: